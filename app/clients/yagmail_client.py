@@ -1,4 +1,6 @@
 from __future__ import annotations
+import atexit
+import threading
 from typing import Any
 import yagmail
 from ..config import Settings
@@ -9,22 +11,61 @@ from email import policy
 from email.parser import BytesParser, Parser
 
 
+#shared yagmail connections keyed by smtp config, reused across invocations.
+_SMTP_POOL: dict[tuple, tuple[yagmail.SMTP, threading.Lock]] = {}
+_SMTP_POOL_LOCK = threading.Lock()
+
+
+def _get_smtp(settings: Settings) -> tuple[yagmail.SMTP, threading.Lock]:
+    key = (
+        settings.yagmail_user,
+        settings.yagmail_password,
+        settings.yagmail_host,
+        settings.yagmail_port,
+        settings.yagmail_smtp_starttls,
+        settings.yagmail_smtp_ssl,
+    )
+    with _SMTP_POOL_LOCK:
+        entry = _SMTP_POOL.get(key)
+        if entry is None:
+            kwargs: dict[str, Any] = {"user": settings.yagmail_user, "password": settings.yagmail_password}
+            if settings.yagmail_host:
+                kwargs["host"] = settings.yagmail_host
+            if settings.yagmail_port is not None:
+                kwargs["port"] = settings.yagmail_port
+            if settings.yagmail_smtp_starttls is not None:
+                kwargs["smtp_starttls"] = settings.yagmail_smtp_starttls
+            if settings.yagmail_smtp_ssl is not None:
+                kwargs["smtp_ssl"] = settings.yagmail_smtp_ssl
+
+            smtp = yagmail.SMTP(**kwargs)
+            atexit.register(smtp.close)
+            entry = (smtp, threading.Lock())
+            _SMTP_POOL[key] = entry
+        return entry
+
+
 class YagmailClient(EmailClient):
     def __init__(self, settings: Settings):
         if not settings.yagmail_user or not settings.yagmail_password:
             raise ValueError("NA_YAGMAIL_USER and NA_YAGMAIL_PASSWORD are required for yagmail client")
         self._settings = settings
-        kwargs: dict[str, Any] = {"user": settings.yagmail_user, "password": settings.yagmail_password}
-        if settings.yagmail_host:
-            kwargs["host"] = settings.yagmail_host
-        if settings.yagmail_port is not None:
-            kwargs["port"] = settings.yagmail_port
-        if settings.yagmail_smtp_starttls is not None:
-            kwargs["smtp_starttls"] = settings.yagmail_smtp_starttls
-        if settings.yagmail_smtp_ssl is not None:
-            kwargs["smtp_ssl"] = settings.yagmail_smtp_ssl
-
-        self._smtp = yagmail.SMTP(**kwargs)
+        self._smtp, self._smtp_lock = _get_smtp(settings)
+
+    def _reconnect(self) -> None:
+        self._smtp.close()
+        self._smtp.login()
+
+    def _ensure_connected(self) -> None:
+        #yagmail.SMTP.send() logs in again on every call; keep our own live connection instead.
+        conn = self._smtp.smtp
+        if conn is not None and not self._smtp.is_closed:
+            try:
+                if conn.noop()[0] == 250:
+                    return
+            except (smtplib.SMTPException, OSError):
+                pass
+        self._reconnect()
 
     def _normalize_raw_mime(self, raw_mime: str) -> bytes:
         raw = raw_mime.replace("\r\n", "\n").replace("\r", "\n").encode("utf-8", errors="replace")
@@ -41,35 +82,20 @@ class YagmailClient(EmailClient):
 
         return msg.as_bytes(policy=policy.SMTP)
 
-    def _send_raw_via_smtplib(self, raw_mime: str, recipients: list[str]) -> None:
-        host = self._settings.yagmail_host or "smtp.gmail.com"
-        port = self._settings.yagmail_port or (465 if self._settings.yagmail_smtp_ssl else 587)
-
-        if self._settings.yagmail_smtp_ssl:
-            server: smtplib.SMTP = smtplib.SMTP_SSL(host, port)
-        else:
-            server = smtplib.SMTP(host, port)
-
-        raw_bytes = self._normalize_raw_mime(raw_mime)
-
-        try:
-            server.ehlo()
-            if (not self._settings.yagmail_smtp_ssl) and (self._settings.yagmail_smtp_starttls is not False):
-                server.starttls()
-                server.ehlo()
-
-            server.login(self._settings.yagmail_user, self._settings.yagmail_password)
-            server.sendmail(self._settings.yagmail_user, recipients, raw_bytes)
-        finally:
+    def _sendmail(self, recipients: list[str], payload: str | bytes) -> None:
+        with self._smtp_lock:
+            self._ensure_connected()
             try:
-                server.quit()
-            except Exception:
-                server.close()
+                self._smtp.smtp.sendmail(self._smtp.user, recipients, payload)
+            except (smtplib.SMTPServerDisconnected, smtplib.SMTPConnectError):
+                #connection dropped between the health check and the send; retry once.
+                self._reconnect()
+                self._smtp.smtp.sendmail(self._smtp.user, recipients, payload)
 
     def send(self, message: EmailMessage) -> None:
 
         if message.raw_mime:
-            self._send_raw_via_smtplib(message.raw_mime, list(message.to) + (list(message.cc) if message.cc else []) + (list(message.bcc) if message.bcc else []))
+            self._sendmail([*message.to, *message.cc, *message.bcc], self._normalize_raw_mime(message.raw_mime))
             return
 
         contents = []
@@ -78,11 +104,12 @@ class YagmailClient(EmailClient):
         elif message.text:
             contents.append(message.text)
 
-        self._smtp.send(
-            to=list(message.to),
+        recipients, msg_string = self._smtp.prepare_send(
+            to=message.to,
             subject=message.subject,
             contents=contents,
-            cc=list(message.cc) if message.cc else None,
-            bcc=list(message.bcc) if message.bcc else None,
+            cc=message.cc or None,
+            bcc=message.bcc or None,
             headers=dict(message.headers) if message.headers else None,
         )
+        self._sendmail(recipients, msg_string)
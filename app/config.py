@@ -49,6 +49,7 @@ class Settings(BaseModel):
     #email client
     email_client: str = Field(default="yagmail", alias="NA_EMAIL_CLIENT")
     dry_run: bool = Field(default=False, alias="NA_DRY_RUN")
+    send_async: bool = Field(default=False, alias="NA_SEND_ASYNC")
 
     #yagmail
     yagmail_user: str | None = Field(default=None, alias="NA_YAGMAIL_USER")
@@ -1,7 +1,11 @@
 from __future__ import annotations
-from typing import Any
+from dataclasses import fields
+from operator import attrgetter
+from typing import Any, Callable
 from .models import EventContext
 
+_CTX_FIELDS = frozenset(f.name for f in fields(EventContext))
+
 
 def _get_attr(ctx: EventContext,
               key: str) -> Any:
@@ -11,6 +15,46 @@ def _get_attr(ctx: EventContext,
     return ctx.extensions.get(key)
 
 
+def _compile_getter(key: str) -> Callable[[EventContext], Any]:
+    #same lookup as _get_attr, but the attribute/extension decision is made once.
+    if key in _CTX_FIELDS or hasattr(EventContext, key):
+        return attrgetter(key)
+    return lambda ctx: ctx.extensions.get(key)
+
+
+def _compile_check(key: str,
+                   expected: Any) -> Callable[[EventContext], bool]:
+    get = _compile_getter(key)
+    if not isinstance(expected, (list, tuple, set)):
+        return lambda ctx: get(ctx) == expected
+
+    try:
+        lookup: Any = frozenset(expected)
+    except TypeError:
+        #unhashable expected values, keep the linear scan.
+        lookup = expected
+
+    def check(ctx: EventContext) -> bool:
+        actual = get(ctx)
+        try:
+            return actual in lookup
+        except TypeError:
+            return actual in expected
+
+    return check
+
+
+def compile_filters(filters: dict[str, Any],
+                    mode: str = "all") -> Callable[[EventContext], bool]:
+    #predicate equivalent to matches_filters, built once for a fixed set of filters.
+    if not filters:
+        return lambda ctx: True
+    checks = [_compile_check(k, expected) for k, expected in filters.items()]
+    if mode == "all":
+        return lambda ctx: all(check(ctx) for check in checks)
+    return lambda ctx: any(check(ctx) for check in checks)
+
+
 def matches_filters(ctx: EventContext,
                     filters: dict[str, Any],
                     mode: str = "all") -> bool:
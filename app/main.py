@@ -1,26 +1,51 @@
 from __future__ import annotations
 
+import atexit
+import functools
+import json
 import logging
 import os
+import threading
 import functions_framework
-from typing import Any
-from cloudevents.http import from_http
+import orjson
+from concurrent.futures import Future, ThreadPoolExecutor
+from typing import TYPE_CHECKING, Any, Callable, Sequence
+from cloudevents.http import from_dict, from_http
 from flask import Request
-from .clients.factory import create_email_client
-from .config import load_settings
-from .filtering import matches_filters
+from .config import Settings, load_settings
+from .filtering import compile_filters
 from .models import EmailMessage, EventContext
-from .templating import TemplateRenderer
+
+if TYPE_CHECKING:
+    from .templating import TemplateRenderer
 
 
 logger = logging.getLogger("na_emailer")
 _LOGGING_CONFIGURED = False
+_CURRENT_LEVEL: int | None = None
+_LEVELS: dict[str, int] = {
+    "CRITICAL": logging.CRITICAL,
+    "FATAL": logging.FATAL,
+    "ERROR": logging.ERROR,
+    "WARNING": logging.WARNING,
+    "WARN": logging.WARN,
+    "INFO": logging.INFO,
+    "DEBUG": logging.DEBUG,
+    "NOTSET": logging.NOTSET,
+}
+
+
+def _resolve_level(level_name: str) -> int:
+    return _LEVELS.get((level_name or "INFO").upper(), logging.INFO)
 
 
 def _configure_logging(level_name: str) -> None:
-    global _LOGGING_CONFIGURED
+    global _LOGGING_CONFIGURED, _CURRENT_LEVEL
 
-    level = getattr(logging, (level_name or "INFO").upper(), logging.INFO)
+    level = _resolve_level(level_name)
+    if level == _CURRENT_LEVEL:
+        return
+    _CURRENT_LEVEL = level
 
     root = logging.getLogger()
     if not root.handlers:
@@ -37,31 +62,122 @@ def _configure_logging(level_name: str) -> None:
 
 _configure_logging(os.getenv("NA_LOG_LEVEL", "INFO"))
 
+#background senders for NA_SEND_ASYNC; drained on instance shutdown.
+_SEND_EXECUTOR = ThreadPoolExecutor(max_workers=4, thread_name_prefix="na-emailer-send")
+#caps queued + running sends; when full, requests fall back to sending inline.
+_SEND_SLOTS = threading.BoundedSemaphore(32)
+atexit.register(_SEND_EXECUTOR.shutdown, wait=True)
+
+#renderers keyed by inline templates from ce data (None = templates from settings)
+_RENDERER_CACHE: dict[tuple | None, TemplateRenderer] = {}
+_RENDERER_CACHE_MAX = 32
+
+
+@functools.lru_cache(maxsize=1)
+def _get_settings() -> Settings:
+    #env does not change during the instance lifetime, so parse it once.
+    return load_settings()
+
+
+@functools.lru_cache(maxsize=1)
+def _get_event_filter() -> Callable[[EventContext], bool]:
+    settings = _get_settings()
+    return compile_filters(settings.filters_json, settings.filter_mode)
+
+
+def _get_renderer(settings: Settings,
+                  inline_templates: dict[str, str] | None = None) -> TemplateRenderer:
+    key = None if inline_templates is None else tuple(sorted(inline_templates.items()))
+    renderer = _RENDERER_CACHE.get(key)
+    if renderer is None:
+        #jinja2 is only imported once an event actually needs rendering.
+        from .templating import TemplateRenderer
+
+        if inline_templates is not None:
+            #never mutate the cached settings, they are shared across requests.
+            settings = settings.model_copy(update={"templates_inline_json": inline_templates})
+        renderer = TemplateRenderer(settings)
+        if len(_RENDERER_CACHE) >= _RENDERER_CACHE_MAX:
+            _RENDERER_CACHE.clear()
+        _RENDERER_CACHE[key] = renderer
+    return renderer
+
+
+_MIME_CONTENT_TYPES: frozenset[str] = frozenset({"mimemultipart", "mime/multipart", "multipart/mixed"})
+
+_SUPPORTED_SPECVERSIONS: frozenset[str] = frozenset({"1.0", "0.3"})
+
+_SPEC_KEYS: frozenset[str] = frozenset({
+    "id",
+    "source",
+    "type",
+    "specversion",
+    "subject",
+    "time",
+    "dataschema",
+    "emailto",
+    "emailcc",
+    "emailbcc",
+    "datacontenttype",
+    "data",
+})
+
+
+def _loads_json(content: str | bytes) -> Any:
+    #orjson first; stdlib json still accepts what orjson rejects (e.g. NaN/Infinity).
+    #note: orjson decodes integers wider than 64 bits as floats.
+    try:
+        return orjson.loads(content)
+    except orjson.JSONDecodeError:
+        return json.loads(content)
+
+
+def _unmarshal_data(content: str | bytes | None) -> Any:
+    #same contract as the SDK default: json if it decodes, otherwise the raw content.
+    if content is None:
+        return None
+    try:
+        return _loads_json(content)
+    except (json.JSONDecodeError, TypeError, UnicodeDecodeError):
+        return content
+
+
+def _parse_cloudevent(request: Request):
+    headers = request.headers
+    body = request.get_data()
+
+    if "ce-specversion" in headers:
+        #binary mode: always try json, MIME bodies may be {"raw_mime": ...} objects.
+        return from_http(headers, body, data_unmarshaller=_unmarshal_data)
+
+    #structured mode: from_http decodes the envelope twice and round-trips data through
+    #json.dumps/json.loads; decode it once and build the event from the dict instead.
+    try:
+        raw_ce = _loads_json(body)
+    except (json.JSONDecodeError, UnicodeDecodeError):
+        raw_ce = None
+    if isinstance(raw_ce, dict) and {"specversion", "id", "source", "type"} <= raw_ce.keys() and "data_base64" not in raw_ce:
+        if raw_ce.get("data") == "":
+            raw_ce["data"] = None
+        return from_dict(raw_ce)
+
+    #let the SDK handle (and report) anything unusual.
+    return from_http(headers, body, data_unmarshaller=_unmarshal_data)
+
 
 def _ctx_from_cloudevent(ce) -> EventContext:
     #ce SDK objects are mapping-like, but dict(ce) is not reliable across versions.
-    spec_keys = {
-        "id",
-        "source",
-        "type",
-        "specversion",
-        "subject",
-        "time",
-        "dataschema",
-        "emailto",
-        "emailcc",
-        "emailbcc",
-        "datacontenttype",
-        "data",
-    }
-
     raw_attrs = getattr(ce, "_attributes", None)
     if isinstance(raw_attrs, dict):
         attrs = raw_attrs
     else:
         attrs = {}
 
-    extensions = {k: v for k, v in attrs.items() if k not in spec_keys}
+    #most events carry only spec attributes, skip building the dict in that case.
+    extensions: dict[str, Any] = {}
+    if attrs.keys() - _SPEC_KEYS:
+        #keep attribute order so templates iterating over ce render deterministically.
+        extensions = {k: v for k, v in attrs.items() if k not in _SPEC_KEYS}
     return EventContext(
         id=ce["id"],
         source=ce["source"],
@@ -77,19 +193,145 @@ def _ctx_from_cloudevent(ce) -> EventContext:
         extensions=extensions,
     )
 
-def _parse_recipients(value) -> list[str]:
+def _is_valid_binary_event(headers) -> bool:
+    #only take header shortcuts for binary events the SDK would accept; anything else
+    #goes through the full parse so it is still reported as 400.
+    if headers.get("ce-specversion") not in _SUPPORTED_SPECVERSIONS:
+        return False
+    return all(headers.get(h) for h in ("ce-id", "ce-source", "ce-type"))
+
+
+def _log_received_from_headers(headers) -> None:
+    #header shortcuts skip the full parse, keep the per-event log line it would emit.
+    logger.info(
+        "CloudEvent received",
+        extra={
+            "ce_id": headers.get("ce-id"),
+            "ce_type": headers.get("ce-type"),
+            "ce_source": headers.get("ce-source"),
+            "ce_subject": headers.get("ce-subject"),
+        },
+    )
+
+
+def _fast_filter_reject(request: Request,
+                        settings: Settings,
+                        event_filter: Callable[[EventContext], bool]) -> bool:
+    #binary-mode events carry every attribute in ce-* headers, so the filters can run
+    #before the body is decoded. Structured events fall through to the full parse.
+    filters = settings.filters_json
+    if not filters or "data" in filters:
+        return False
+
+    headers = request.headers
+    if not _is_valid_binary_event(headers):
+        return False
+
+    stub = EventContext(
+        id=headers.get("ce-id"),
+        source=headers.get("ce-source"),
+        type=headers.get("ce-type"),
+        subject=headers.get("ce-subject"),
+        time=headers.get("ce-time"),
+        dataschema=headers.get("ce-dataschema"),
+        emailto=headers.get("ce-emailto"),
+        emailcc=headers.get("ce-emailcc"),
+        emailbcc=headers.get("ce-emailbcc"),
+        datacontenttype=headers.get("content-type"),
+        data=None,
+        extensions={k: headers.get(f"ce-{k}") for k in filters.keys() - _SPEC_KEYS},
+    )
+    if event_filter(stub):
+        return False
+
+    _log_received_from_headers(headers)
+    logger.info(
+        "Event filtered out",
+        extra={"ce_id": stub.id, "ce_type": stub.type, "ce_source": stub.source},
+    )
+    return True
+
+
+@functools.lru_cache(maxsize=128)
+def _parse_recipients(value: str | tuple[str, ...] | None) -> tuple[str, ...]:
+    #recipients repeat across events, so parsed results are cached.
     if value in (None, ""):
-        return []
+        return ()
+    if isinstance(value, tuple):
+        return tuple(s for x in value if (s := x.strip()))
+    if isinstance(value, str):
+        return tuple(s for v in value.split(",") if (s := v.strip()))
+    return ()
+
+
+def _recipients_key(value: Any) -> str | tuple[str, ...] | None:
+    #structured events may carry json arrays; lists are not hashable, so hand over tuples.
     if isinstance(value, list):
-        return [str(x).strip() for x in value if str(x).strip()]
+        return tuple(str(x) for x in value)
     if isinstance(value, str):
-        return [v.strip() for v in value.split(",") if v.strip()]
-    return []
+        return value
+    return None
+
+
+def _is_raw_mime(datacontenttype: str | None) -> bool:
+    return (datacontenttype or "").strip().lower() in _MIME_CONTENT_TYPES
+
+
+def _has_recipients(is_raw_mime: bool,
+                    to: Sequence[str],
+                    cc: Sequence[str],
+                    bcc: Sequence[str]) -> bool:
+    #raw MIME can go out to cc/bcc only; templated mail needs a To address.
+    if is_raw_mime:
+        return bool(to or cc or bcc)
+    return bool(to)
+
+
+def _warn_no_recipients(is_raw_mime: bool,
+                        ce_id: str | None,
+                        ce_type: str | None) -> None:
+    if is_raw_mime:
+        logger.warning("No recipients configured; skipping send", extra={"ce_id": ce_id})
+    else:
+        logger.warning(
+            "No recipients configured (NA_EMAIL_TO is empty); skipping send",
+            extra={"ce_id": ce_id, "ce_type": ce_type},
+        )
+
+
+def _fast_skip_no_recipients(request: Request, settings: Settings) -> bool:
+    #binary-mode recipients arrive as ce-email* headers; when nobody would receive a
+    #templated email there is no need to decode the event at all. Raw MIME events always
+    #take the full path, their payload has to be decoded and validated first.
+    headers = request.headers
+    if "data" in settings.filters_json or not _is_valid_binary_event(headers):
+        return False
+    if _is_raw_mime(headers.get("content-type")):
+        return False
+
+    to = _parse_recipients(headers.get("ce-emailto")) or settings.email_to
+    if _has_recipients(False, to, settings.email_cc, settings.email_bcc):
+        return False
+
+    _log_received_from_headers(headers)
+    _warn_no_recipients(False, headers.get("ce-id"), headers.get("ce-type"))
+    return True
 
 
 def _recipients_from_event(ctx: EventContext):
     #support both ce-email_to and email_to in data for maximum flexibility.
-    return _parse_recipients(ctx.emailto), _parse_recipients(ctx.emailcc), _parse_recipients(ctx.emailbcc)
+    return (
+        _parse_recipients(_recipients_key(ctx.emailto)),
+        _parse_recipients(_recipients_key(ctx.emailcc)),
+        _parse_recipients(_recipients_key(ctx.emailbcc)),
+    )
+
+def _ce_headers(ctx: EventContext) -> dict[str, str]:
+    return {
+        "X-CloudEvent-ID": ctx.id,
+        "X-CloudEvent-Type": ctx.type,
+        "X-CloudEvent-Source": ctx.source,
+    }
 
 def _extract_raw_mime(ctx: EventContext) -> str | None:
     data: Any = ctx.data
@@ -108,6 +350,26 @@ def _extract_raw_mime(ctx: EventContext) -> str | None:
             return raw
     return None
 
+def _log_background_send(future: Future, ce_id: str) -> None:
+    _SEND_SLOTS.release()
+    exc = future.exception()
+    if exc is not None:
+        logger.error(f"Failed to send email in background: {exc}", exc_info=exc, extra={"ce_id": ce_id})
+        return
+    logger.info("Email sent", extra={"ce_id": ce_id})
+
+
+def _send_in_background(client, msg: EmailMessage, ce_id: str) -> bool:
+    if not _SEND_SLOTS.acquire(blocking=False):
+        return False
+    try:
+        future = _SEND_EXECUTOR.submit(client.send, msg)
+    except Exception:
+        _SEND_SLOTS.release()
+        raise
+    future.add_done_callback(lambda f: _log_background_send(f, ce_id))
+    return True
+
 @functions_framework.http
 def handle(request: Request):
 
@@ -125,13 +387,20 @@ def handle(request: Request):
         logger.error(f"Invalid HTTP method: {request.method}")
         return ("Method Not Allowed", 405)
 
-    settings = load_settings()
+    settings = _get_settings()
+    event_filter = _get_event_filter()
     _configure_logging(settings.log_level)
 
     logger.info("Request received")
 
+    if _fast_filter_reject(request, settings, event_filter):
+        return ("", 204)
+
+    if _fast_skip_no_recipients(request, settings):
+        return ("", 202)
+
     try:
-        ce = from_http(request.headers, request.get_data())
+        ce = _parse_cloudevent(request)
     except Exception as e:
         logger.exception(f"Failed to parse incoming CloudEvent: {e}")
         return ("Invalid CloudEvent", 400)
@@ -147,7 +416,7 @@ def handle(request: Request):
         extra={"ce_id": ctx.id, "ce_type": ctx.type, "ce_source": ctx.source, "ce_subject": ctx.subject},
     )
 
-    if not matches_filters(ctx, settings.filters_json, settings.filter_mode):
+    if not event_filter(ctx):
         logger.info(
             "Event filtered out",
             extra={"ce_id": ctx.id, "ce_type": ctx.type, "ce_source": ctx.source},
@@ -161,55 +430,34 @@ def handle(request: Request):
     email_bcc = event_bcc or settings.email_bcc
 
     #MIME multipart mode: bypass templating and send raw MIME as-is.
+    is_raw_mime = _is_raw_mime(ctx.datacontenttype)
+    kind = "raw MIME email" if is_raw_mime else "email"
+
     raw_mime = None
-    if (ctx.datacontenttype or "").strip().lower() in {"mimemultipart", "mime/multipart", "multipart/mixed"}:
+    subject, text, html = "", None, None
+    if is_raw_mime:
         raw_mime = _extract_raw_mime(ctx)
         if not raw_mime:
             return ("Missing raw MIME payload in CloudEvent data", 400)
-
-        msg = EmailMessage(
-            subject="",
-            text=None,
-            html=None,
-            sender=settings.email_from,
-            to=recipients,
-            cc=email_cc,
-            bcc=email_bcc,
-            headers={
-                "X-CloudEvent-ID": ctx.id,
-                "X-CloudEvent-Type": ctx.type,
-                "X-CloudEvent-Source": ctx.source,
-            },
-            raw_mime=raw_mime,
-        )
-
-        if not (list(msg.to) or list(msg.cc) or list(msg.bcc)):
-            logger.warning("No recipients configured; skipping send", extra={"ce_id": ctx.id})
+        if not _has_recipients(True, recipients, email_cc, email_bcc):
+            _warn_no_recipients(True, ctx.id, ctx.type)
             return ("", 202)
-
-        if settings.dry_run:
-            logger.info("DRY RUN raw MIME email (not sent)", extra={"ce_id": ctx.id})
+    else:
+        if not _has_recipients(False, recipients, email_cc, email_bcc):
+            _warn_no_recipients(False, ctx.id, ctx.type)
             return ("", 202)
 
+        # if ce contains inline templates
+        inline_templates = None
+        if ctx.data and isinstance(ctx.data, dict) and "templates_inline_json" in ctx.data:
+            inline_templates = ctx.data["templates_inline_json"]
+
         try:
-            client = create_email_client(settings)
-            client.send(msg)
+            renderer = _get_renderer(settings, inline_templates)
+            subject, text, html = renderer.render(ctx)
         except Exception as e:
-            logger.exception(f"Failed to send raw MIME email: {e}")
-            return ("Email send failed", 502)
-
-        return ("", 202)
-
-    # if ce contains inline templates
-    if ctx.data and isinstance(ctx.data, dict) and "templates_inline_json" in ctx.data:
-        settings.templates_inline_json = ctx.data["templates_inline_json"]
-
-    try:
-        renderer = TemplateRenderer(settings)
-        subject, text, html = renderer.render(ctx)
-    except Exception as e:
-        logger.exception(f"Failed to render email templates: {e}")
-        return ("Template rendering failed", 500)
+            logger.exception(f"Failed to render email templates: {e}")
+            return ("Template rendering failed", 500)
 
     msg = EmailMessage(
         subject=subject,
@@ -219,32 +467,25 @@ def handle(request: Request):
         to=recipients,
         cc=email_cc,
         bcc=email_bcc,
-        headers={
-            "X-CloudEvent-ID": ctx.id,
-            "X-CloudEvent-Type": ctx.type,
-            "X-CloudEvent-Source": ctx.source,
-        },
+        headers=_ce_headers(ctx),
         raw_mime=raw_mime,
     )
-    logger.info(f"Prepared email message: subject='{msg.subject}', to={msg.to}, cc={msg.cc}, bcc={msg.bcc}")
-
-    if not msg.to:
-        logger.warning(
-            "No recipients configured (NA_EMAIL_TO is empty); skipping send",
-            extra={"ce_id": ctx.id, "ce_type": ctx.type},
-        )
-        return ("", 202)
+    logger.debug("Prepared %s: subject=%r, to=%s, cc=%s, bcc=%s", kind, msg.subject, msg.to, msg.cc, msg.bcc)
 
     if settings.dry_run:
-        logger.info("DRY RUN email (not sent)", extra={"to": list(msg.to), "subject": msg.subject})
+        logger.info(f"DRY RUN {kind} (not sent)", extra={"to": msg.to, "subject": msg.subject, "ce_id": ctx.id})
         return ("", 202)
 
+    #yagmail is only imported once an email is actually sent.
+    from .clients.factory import create_email_client
+
     try:
         client = create_email_client(settings)
-        client.send(msg)
+        if not (settings.send_async and _send_in_background(client, msg, ctx.id)):
+            client.send(msg)
     except Exception as e:
-        logger.exception(f"Failed to send email: {e}")
+        logger.exception(f"Failed to send {kind}: {e}")
         return ("Email send failed", 502)
 
-    logger.info("Email queued/sent", extra={"to": list(msg.to), "subject": msg.subject, "ce_id": ctx.id})
+    logger.info("Email queued/sent", extra={"to": msg.to, "subject": msg.subject, "ce_id": ctx.id})
     return ("", 202)